@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+Archive cold BigQuery partitions to compressed Parquet instead of expiring them
+
+This script:
+1. Finds date partitions older than the archive age (default 365 days)
+2. Exports each cold partition to hive-partitioned, ZSTD-compressed Parquet
+   (gs:// bucket or local filesystem)
+3. Verifies archived row counts against the partition
+4. Records every archived partition in a manifest table
+5. Drops the partition from the hot table
+
+For year-over-year reports archived history can be:
+- Rehydrated into a short-lived `<table>_rehydrated` table (--rehydrate)
+- Queried in place through a `<table>_archive` external table (--external, gs:// only)
+
+COST IMPACT:
+- Hot tables only hold the last year, so unfiltered and wide-range scans stay small
+- Archived data moves from active storage ($0.02/GB/month) to object storage
+- No history is lost (partition_expiration_days no longer deletes data)
+
+USAGE:
+    python3 scripts/archive-cold-partitions.py                          # dry run
+    python3 scripts/archive-cold-partitions.py --table=gsc_performance_shared --after-days=540
+    python3 scripts/archive-cold-partitions.py --target=gs://my-bucket/bigquery --execute --yes
+
+--target is required to archive in execute mode: partitions are dropped from
+BigQuery once exported, so the destination must be chosen deliberately.
+    python3 scripts/archive-cold-partitions.py --rehydrate=gsc_performance_shared \\
+        --from=2024-01-01 --to=2024-12-31 --execute --yes
+    python3 scripts/archive-cold-partitions.py --external=gsc_performance_shared \\
+        --target=gs://my-bucket/bigquery --execute --yes
+"""
+
+import io
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+from google.cloud import bigquery
+from google.oauth2 import service_account
+from bq_partitions import MANIFEST_TABLE_ID, is_skipped_table, list_date_partitions
+
+SERVICE_ACCOUNT_FILE = '/home/dogancanbaris/projects/MCP Servers/config/service-account-key.json'
+PROJECT_ID = 'mcp-servers-475317'
+DATASET_ID = 'wpp_marketing'
+
+# Partitions older than this are moved to cold storage
+ARCHIVE_AFTER_DAYS = 365
+
+# Parquet compression codec (supported by both EXPORT DATA and pyarrow)
+PARQUET_COMPRESSION = 'ZSTD'
+
+# Rehydrated tables clean themselves up after this many days
+REHYDRATED_EXPIRATION_DAYS = 7
+
+PARTITION_FIELD = 'date'
+
+MANIFEST_SCHEMA = [
+    bigquery.SchemaField("table_name", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("partition_date", "DATE", mode="REQUIRED"),
+    bigquery.SchemaField("uri", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("format", "STRING"),
+    bigquery.SchemaField("compression", "STRING"),
+    bigquery.SchemaField("row_count", "INTEGER"),
+    bigquery.SchemaField("logical_bytes", "INTEGER"),
+    bigquery.SchemaField("archived_at", "TIMESTAMP"),
+]
+
+def get_credentials():
+    """Initialize BigQuery client with service account"""
+    credentials = service_account.Credentials.from_service_account_file(
+        SERVICE_ACCOUNT_FILE,
+        scopes=["https://www.googleapis.com/auth/cloud-platform"],
+    )
+    return bigquery.Client(credentials=credentials, project=PROJECT_ID)
+
+def get_arg_value(name: str, default=None):
+    """Read a --name=value command line argument"""
+    prefix = f"--{name}="
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
+def is_gcs_target(target: str) -> bool:
+    """Object-store targets go through EXPORT DATA, everything else is local"""
+    return target.startswith('gs://')
+
+def partition_uri(target: str, table_name: str, partition_date: date) -> str:
+    """Hive-style location of one archived partition"""
+    return f"{target.rstrip('/')}/{table_name}/{PARTITION_FIELD}={partition_date.isoformat()}"
+
+def ensure_manifest_table(client, dry_run: bool = True):
+    """Create the manifest table if it doesn't exist yet"""
+    manifest_ref = f"{PROJECT_ID}.{DATASET_ID}.{MANIFEST_TABLE_ID}"
+
+    if dry_run:
+        print(f"   [DRY RUN] Would ensure manifest table exists: {MANIFEST_TABLE_ID}")
+        return manifest_ref
+
+    table = bigquery.Table(manifest_ref, schema=MANIFEST_SCHEMA)
+    table.clustering_fields = ['table_name']
+    client.create_table(table, exists_ok=True)
+    return manifest_ref
+
+def load_manifest(client, table_name: str) -> dict:
+    """Return {partition_date: latest manifest row} for a table's archived partitions"""
+    manifest_ref = f"{PROJECT_ID}.{DATASET_ID}.{MANIFEST_TABLE_ID}"
+
+    try:
+        client.get_table(manifest_ref)
+    except Exception:
+        return {}
+
+    sql = f"""
+    SELECT table_name, partition_date, uri, format, compression, row_count, logical_bytes
+    FROM `{manifest_ref}`
+    WHERE table_name = @table_name
+    -- A re-archived partition has several rows, only the latest export is current
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY partition_date ORDER BY archived_at DESC) = 1
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("table_name", "STRING", table_name)]
+    )
+    return {row['partition_date']: dict(row) for row in client.query(sql, job_config=job_config).result()}
+
+def record_in_manifest(client, entry: dict):
+    """Append one archived partition to the manifest table"""
+    manifest_ref = f"{PROJECT_ID}.{DATASET_ID}.{MANIFEST_TABLE_ID}"
+
+    job_config = bigquery.LoadJobConfig(
+        schema=MANIFEST_SCHEMA,
+        write_disposition="WRITE_APPEND"
+    )
+    row = dict(entry)
+    row['partition_date'] = entry['partition_date'].isoformat()
+    row['archived_at'] = datetime.now(timezone.utc).isoformat()
+
+    client.load_table_from_json([row], manifest_ref, job_config=job_config).result()
+
+def list_cold_partitions(client, table_name: str, cutoff: date) -> list:
+    """List non-empty date partitions older than the cutoff"""
+    return [
+        partition for partition in list_date_partitions(client, PROJECT_ID, DATASET_ID, table_name)
+        if partition['partition_date'] < cutoff and partition['total_rows']
+    ]
+
+def is_archivable(table) -> bool:
+    """Only daily partitioning on the date column is archived"""
+    tp = table.time_partitioning
+    return bool(tp) and tp.type_ == bigquery.TimePartitioningType.DAY and tp.field == PARTITION_FIELD
+
+def export_partition_to_gcs(client, table_ref: str, partition_date: date, uri: str):
+    """Export one partition with EXPORT DATA (partition column lives in the path)"""
+    export_sql = f"""
+    EXPORT DATA OPTIONS(
+      uri = '{uri}/*.parquet',
+      format = 'PARQUET',
+      compression = '{PARQUET_COMPRESSION}',
+      overwrite = TRUE
+    )
+    AS SELECT * EXCEPT({PARTITION_FIELD})
+    FROM `{table_ref}`
+    WHERE {PARTITION_FIELD} = '{partition_date.isoformat()}'
+    """
+    client.query(export_sql).result()
+
+def count_gcs_rows(client, uri: str) -> int:
+    """Count archived rows through a temporary external table (Parquet footers only)"""
+    external_config = bigquery.ExternalConfig('PARQUET')
+    external_config.source_uris = [f"{uri}/*.parquet"]
+
+    job_config = bigquery.QueryJobConfig(table_definitions={'archived_partition': external_config})
+    rows = client.query("SELECT COUNT(*) AS n FROM archived_partition", job_config=job_config).result()
+    return next(iter(rows))['n']
+
+def export_partition_to_local(client, table, partition_date: date, uri: str) -> int:
+    """Write one partition to a local Parquet file, returns rows written"""
+    import pyarrow.parquet as pq
+
+    selected_fields = [field for field in table.schema if field.name != PARTITION_FIELD]
+    partition_ref = f"{table.project}.{table.dataset_id}.{table.table_id}${partition_date.strftime('%Y%m%d')}"
+    arrow_table = client.list_rows(partition_ref, selected_fields=selected_fields).to_arrow()
+
+    os.makedirs(uri, exist_ok=True)
+    pq.write_table(arrow_table, os.path.join(uri, 'part-00000.parquet'), compression=PARQUET_COMPRESSION.lower())
+
+    return pq.read_metadata(os.path.join(uri, 'part-00000.parquet')).num_rows
+
+def disable_partition_expiration(client, table, dry_run: bool = True):
+    """
+    Clear partition_expiration_days on a table being archived
+
+    Expiration would otherwise silently delete partitions before they're archived.
+    """
+    expiration_ms = table.time_partitioning.expiration_ms
+    if not expiration_ms:
+        return
+
+    expiration_days = expiration_ms / (1000 * 60 * 60 * 24)
+    print(f"   ⚠️  partition_expiration_days = {expiration_days:.0f} (would delete history)")
+
+    alter_sql = f"""
+    ALTER TABLE `{table.project}.{table.dataset_id}.{table.table_id}`
+    SET OPTIONS (partition_expiration_days = NULL)
+    """
+
+    if dry_run:
+        print(f"   [DRY RUN] Would clear partition expiration (archiving handles retention)")
+    else:
+        client.query(alter_sql).result()
+        print(f"   ✅ Partition expiration cleared (archiving handles retention)")
+
+def archive_table(client, table_name: str, target: str, after_days: int, dry_run: bool = True) -> dict:
+    """
+    Archive cold partitions of one table
+
+    Steps per partition:
+    1. Export to Parquet
+    2. Verify row count matches the partition
+    3. Record in manifest
+    4. Drop the partition from the hot table
+    """
+    print(f"\n{'='*80}")
+    print(f"Archiving: {table_name}")
+    print("=" * 80)
+
+    table_ref = f"{PROJECT_ID}.{DATASET_ID}.{table_name}"
+    table = client.get_table(table_ref)
+    summary = {'partitions': 0, 'rows': 0, 'bytes': 0}
+
+    if not is_archivable(table):
+        print(f"   ⏭️  Skipping (not partitioned by DAY on '{PARTITION_FIELD}')")
+        return summary
+
+    disable_partition_expiration(client, table, dry_run)
+
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=after_days)
+    print(f"\n1. Finding partitions older than {cutoff} ({after_days} days)...")
+    partitions = list_cold_partitions(client, table_name, cutoff)
+
+    if not partitions:
+        print(f"   ✅ No cold partitions. Nothing to archive.")
+        return summary
+
+    archived = load_manifest(client, table_name)
+    total_rows = sum(p['total_rows'] for p in partitions)
+    total_bytes = sum(p['total_logical_bytes'] for p in partitions)
+    print(f"   Found {len(partitions)} cold partitions ({total_rows:,} rows, {total_bytes / (1024**3):.2f} GB)")
+    print(f"   Range: {partitions[0]['partition_date']} → {partitions[-1]['partition_date']}")
+
+    print(f"\n2. Exporting to {target}...")
+
+    for partition in partitions:
+        partition_date = partition['partition_date']
+        uri = partition_uri(target, table_name, partition_date)
+
+        if dry_run:
+            print(f"   [DRY RUN] {partition_date}: {partition['total_rows']:,} rows → {uri}")
+            summary['partitions'] += 1
+            summary['rows'] += partition['total_rows']
+            summary['bytes'] += partition['total_logical_bytes']
+            continue
+
+        try:
+            # Re-run after a partial failure: export already recorded, only the drop is missing
+            already_archived = archived.get(partition_date)
+            if already_archived and already_archived['row_count'] == partition['total_rows']:
+                print(f"   ↪️  {partition_date}: already in manifest, dropping hot partition")
+            else:
+                if is_gcs_target(target):
+                    export_partition_to_gcs(client, table_ref, partition_date, uri)
+                    archived_rows = count_gcs_rows(client, uri)
+                else:
+                    archived_rows = export_partition_to_local(client, table, partition_date, uri)
+
+                if archived_rows != partition['total_rows']:
+                    print(f"   ❌ {partition_date}: ROW COUNT MISMATCH "
+                          f"({archived_rows:,} archived vs {partition['total_rows']:,} hot). Keeping partition.")
+                    continue
+
+                record_in_manifest(client, {
+                    'table_name': table_name,
+                    'partition_date': partition_date,
+                    'uri': uri,
+                    'format': 'PARQUET',
+                    'compression': PARQUET_COMPRESSION,
+                    'row_count': archived_rows,
+                    'logical_bytes': partition['total_logical_bytes'],
+                })
+
+            client.delete_table(f"{table_ref}${partition['partition_id']}")
+            print(f"   ✅ {partition_date}: {partition['total_rows']:,} rows archived and dropped")
+
+            summary['partitions'] += 1
+            summary['rows'] += partition['total_rows']
+            summary['bytes'] += partition['total_logical_bytes']
+        except Exception as e:
+            print(f"   ❌ {partition_date}: {e}")
+            print(f"   Partition kept in hot table. Re-run to retry.")
+
+    return summary
+
+def rehydrate_table(client, table_name: str, start: date, end: date, dry_run: bool = True):
+    """
+    Load archived partitions back into `<table>_rehydrated` for YoY reports
+
+    The rehydrated table expires partitions after REHYDRATED_EXPIRATION_DAYS.
+    """
+    print(f"\n{'='*80}")
+    print(f"Rehydrating: {table_name} ({start} → {end})")
+    print("=" * 80)
+
+    hot_table = client.get_table(f"{PROJECT_ID}.{DATASET_ID}.{table_name}")
+    rehydrated_ref = f"{PROJECT_ID}.{DATASET_ID}.{table_name}_rehydrated"
+
+    entries = [
+        entry for partition_date, entry in sorted(load_manifest(client, table_name).items())
+        if start <= partition_date <= end
+    ]
+
+    if not entries:
+        print(f"   ❌ No archived partitions in range (check {MANIFEST_TABLE_ID})")
+        return
+
+    total_rows = sum(entry['row_count'] for entry in entries)
+    print(f"\n   {len(entries)} archived partitions ({total_rows:,} rows)")
+
+    if dry_run:
+        print(f"   [DRY RUN] Would load into: {table_name}_rehydrated")
+        print(f"   [DRY RUN] Rehydrated data expires after {REHYDRATED_EXPIRATION_DAYS} days")
+        return
+
+    rehydrated = bigquery.Table(rehydrated_ref, schema=hot_table.schema)
+    rehydrated.time_partitioning = bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.DAY,
+        field=PARTITION_FIELD,
+        expiration_ms=REHYDRATED_EXPIRATION_DAYS * 24 * 60 * 60 * 1000,
+    )
+    rehydrated.clustering_fields = hot_table.clustering_fields
+    client.create_table(rehydrated, exists_ok=True)
+
+    for entry in entries:
+        partition_date = entry['partition_date']
+        # Partition decorator + WRITE_TRUNCATE makes re-runs idempotent
+        destination = f"{rehydrated_ref}${partition_date.strftime('%Y%m%d')}"
+
+        try:
+            if entry['uri'].startswith('gs://'):
+                hive_options = bigquery.HivePartitioningOptions()
+                hive_options.mode = 'CUSTOM'
+                hive_options.source_uri_prefix = f"{entry['uri'].rsplit('/', 1)[0]}/{{{PARTITION_FIELD}:DATE}}"
+
+                job_config = bigquery.LoadJobConfig(
+                    source_format=bigquery.SourceFormat.PARQUET,
+                    write_disposition="WRITE_TRUNCATE",
+                    hive_partitioning=hive_options,
+                )
+                client.load_table_from_uri(f"{entry['uri']}/*.parquet", destination, job_config=job_config).result()
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                # Partition column lives in the path, add it back before loading
+                arrow_table = pq.read_table(entry['uri'])
+                arrow_table = arrow_table.append_column(
+                    PARTITION_FIELD, pa.array([partition_date] * arrow_table.num_rows, type=pa.date32())
+                )
+                buffer = io.BytesIO()
+                pq.write_table(arrow_table, buffer, compression=PARQUET_COMPRESSION.lower())
+                buffer.seek(0)
+
+                job_config = bigquery.LoadJobConfig(
+                    source_format=bigquery.SourceFormat.PARQUET,
+                    write_disposition="WRITE_TRUNCATE",
+                )
+                client.load_table_from_file(buffer, destination, job_config=job_config).result()
+
+            print(f"   ✅ {partition_date}: {entry['row_count']:,} rows")
+        except Exception as e:
+            print(f"   ❌ {partition_date}: {e}")
+
+    print(f"\n✅ Rehydrated into: {table_name}_rehydrated")
+    print(f"   Partitions expire after {REHYDRATED_EXPIRATION_DAYS} days")
+
+def create_external_archive_table(client, table_name: str, target: str, dry_run: bool = True):
+    """
+    Create `<table>_archive` external table over the archived Parquet files
+
+    Queries read straight from object storage, filtered by the hive `date` key.
+    """
+    print(f"\n{'='*80}")
+    print(f"External archive table: {table_name}_archive")
+    print("=" * 80)
+
+    if not is_gcs_target(target):
+        print(f"   ❌ External tables need a gs:// target. Use --rehydrate for local archives.")
+        return
+
+    archive_prefix = f"{target.rstrip('/')}/{table_name}"
+    external_ref = f"{PROJECT_ID}.{DATASET_ID}.{table_name}_archive"
+
+    hive_options = bigquery.HivePartitioningOptions()
+    hive_options.mode = 'CUSTOM'
+    hive_options.source_uri_prefix = f"{archive_prefix}/{{{PARTITION_FIELD}:DATE}}"
+    hive_options.require_partition_filter = True
+
+    external_config = bigquery.ExternalConfig('PARQUET')
+    external_config.source_uris = [f"{archive_prefix}/*"]
+    external_config.hive_partitioning = hive_options
+
+    if dry_run:
+        print(f"   [DRY RUN] Would create external table over: {archive_prefix}/*")
+        return
+
+    table = bigquery.Table(external_ref)
+    table.external_data_configuration = external_config
+    client.create_table(table, exists_ok=True)
+
+    print(f"   ✅ Created: {table_name}_archive")
+    print(f"   📝 Example YoY query:")
+    print(f"      SELECT * FROM `{external_ref}` WHERE {PARTITION_FIELD} BETWEEN '2024-01-01' AND '2024-12-31'")
+
+def main():
+    """Main archive workflow"""
+    print("=" * 80)
+    print("BigQuery Cold Partition Archive - Parquet Cold Tier")
+    print("=" * 80)
+    print(f"\nProject: {PROJECT_ID}")
+    print(f"Dataset: {DATASET_ID}")
+    print(f"Timestamp: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}")
+
+    # Check for dry-run flag
+    dry_run = '--execute' not in sys.argv
+    confirm_flag = '--yes' in sys.argv or '-y' in sys.argv
+
+    # gs://bucket/prefix or a local directory (object-store stand-in), no default
+    target = get_arg_value('target')
+    after_days = int(get_arg_value('after-days', ARCHIVE_AFTER_DAYS))
+    only_table = get_arg_value('table')
+    rehydrate = get_arg_value('rehydrate')
+    external = get_arg_value('external')
+
+    print(f"Target: {target or '(none, pass --target=gs://bucket/prefix)'}")
+
+    if dry_run:
+        print("\n⚠️  DRY RUN MODE - No changes will be made")
+        print("   To execute, run with: --execute --yes")
+    else:
+        print("\n🚨 EXECUTE MODE - Changes WILL be made!")
+        if not confirm_flag:
+            print("\n   Add --yes flag to confirm execution")
+            print("   Example: python3 scripts/archive-cold-partitions.py --target=gs://my-bucket/bigquery --execute --yes")
+            return
+        print("   Confirmed with --yes flag. Proceeding...")
+
+    # Initialize client
+    print("\nInitializing BigQuery client...")
+    client = get_credentials()
+
+    if rehydrate:
+        start = datetime.strptime(get_arg_value('from', '1970-01-01'), '%Y-%m-%d').date()
+        end = datetime.strptime(get_arg_value('to', date.today().isoformat()), '%Y-%m-%d').date()
+        rehydrate_table(client, rehydrate, start, end, dry_run)
+        return
+
+    # Partitions are dropped after export, never archive to an implicit location
+    if not target:
+        if not dry_run:
+            print("\n❌ --target is required in execute mode (partitions are dropped after export)")
+            print("   Example: python3 scripts/archive-cold-partitions.py --target=gs://my-bucket/bigquery --execute --yes")
+            return
+        target = 'gs://<bucket>/<prefix>'
+    elif not is_gcs_target(target) and not dry_run:
+        print(f"\n⚠️  Local target: {target} will hold the only copy of dropped partitions")
+
+    if external:
+        create_external_archive_table(client, external, target, dry_run)
+        return
+
+    print(f"\nPreparing manifest table...")
+    ensure_manifest_table(client, dry_run)
+
+    if only_table:
+        table_names = [only_table]
+    else:
+        print(f"\nScanning tables in {DATASET_ID}...")
+        dataset = client.get_dataset(f"{PROJECT_ID}.{DATASET_ID}")
+        table_names = [
+            item.table_id for item in client.list_tables(dataset)
+            if not is_skipped_table(item.table_id)
+        ]
+        print(f"Found {len(table_names)} tables")
+
+    totals = {'partitions': 0, 'rows': 0, 'bytes': 0}
+    for table_name in table_names:
+        summary = archive_table(client, table_name, target, after_days, dry_run)
+        for key in totals:
+            totals[key] += summary[key]
+
+    # Final summary
+    print("\n" + "=" * 80)
+    print("ARCHIVE COMPLETE")
+    print("=" * 80)
+
+    size_gb = totals['bytes'] / (1024**3)
+    print(f"\n   Partitions {'to archive' if dry_run else 'archived'}: {totals['partitions']:,}")
+    print(f"   Rows: {totals['rows']:,}")
+    print(f"   Hot storage freed: {size_gb:.2f} GB")
+    print(f"   Active storage saved: ${size_gb * 0.02:.2f}/month")
+
+    if dry_run:
+        print("\n⚠️  This was a DRY RUN - no changes were made")
+        print("\nTo execute:")
+        print("   python3 scripts/archive-cold-partitions.py --target=gs://my-bucket/bigquery --execute --yes")
+
+    print("\n" + "=" * 80)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\nAborted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
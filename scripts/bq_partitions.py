@@ -0,0 +1,58 @@
+"""
+Shared BigQuery partition helpers for the maintenance scripts
+
+Used by migrate-to-partitioned-tables.py and archive-cold-partitions.py so
+both agree on which tables to leave alone and how partitions are listed.
+"""
+
+from datetime import datetime
+from google.cloud import bigquery
+
+# Records every archived partition (archive-cold-partitions.py)
+MANIFEST_TABLE_ID = 'partition_archive_manifest'
+
+# Partitions rewritten by migrate-to-partitioned-tables.py --recluster-days
+RECLUSTER_PROGRESS_TABLE_ID = 'reclustering_progress'
+
+# Bookkeeping tables created by the maintenance scripts themselves
+BOOKKEEPING_TABLE_IDS = {MANIFEST_TABLE_ID, RECLUSTER_PROGRESS_TABLE_ID}
+
+# Backup, temporary-copy and cold-tier tables
+SKIP_TABLE_MARKERS = ('_backup', '_partitioned', '_rehydrated', '_archive')
+
+def is_skipped_table(table_name: str) -> bool:
+    """Backup, temporary and bookkeeping tables are never migrated or archived"""
+    return (
+        any(marker in table_name for marker in SKIP_TABLE_MARKERS)
+        or table_name.startswith('temp_')
+        or table_name in BOOKKEEPING_TABLE_IDS
+    )
+
+def list_date_partitions(client, project_id: str, dataset_id: str, table_name: str) -> list:
+    """
+    List a table's daily partitions, oldest first
+
+    Reads INFORMATION_SCHEMA.PARTITIONS (metadata only, no table scan).
+    Special IDs (__NULL__, __UNPARTITIONED__, __STREAMING_UNPARTITIONED__)
+    are filtered out in SQL.
+    """
+    sql = f"""
+    SELECT partition_id, total_rows, total_logical_bytes
+    FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.PARTITIONS`
+    WHERE table_name = @table_name
+      AND SAFE.PARSE_DATE('%Y%m%d', partition_id) IS NOT NULL
+    ORDER BY partition_id
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("table_name", "STRING", table_name)]
+    )
+
+    return [
+        {
+            'partition_id': row['partition_id'],
+            'partition_date': datetime.strptime(row['partition_id'], '%Y%m%d').date(),
+            'total_rows': row['total_rows'] or 0,
+            'total_logical_bytes': row['total_logical_bytes'] or 0,
+        }
+        for row in client.query(sql, job_config=job_config).result()
+    ]
@@ -3,16 +3,20 @@
 Create a comprehensive GSC Performance Dashboard in Superset
 - KPI Scorecards (Clicks, Impressions, CTR, Position)
 - Time Series Chart with date controls
-- Top Queries Table
+- Top Queries Table (merged from ingestion sketches, not raw rows)
+- Unique Queries / Unique Pages (HyperLogLog sketches)
 - Country and Device filters
 """
 
 import requests
 import json
+from gsc_sketches import SKETCH_TABLE_ID, top_k_sql, distinct_count_sql
 
 base_url = "https://superset-60184572847.us-central1.run.app"
 session = requests.Session()
 
+SKETCH_TABLE_REF = f"mcp-servers-475317.wpp_marketing.{SKETCH_TABLE_ID}"
+
 print("🚀 Creating GSC Performance Dashboard...\n")
 
 # Step 1: Login
@@ -111,25 +115,82 @@ if ts_r.status_code in [200, 201]:
     charts.append(ts_r.json()["id"])
     print("✅ Time series chart created\n")
 
-# Step 5: Create Top Queries Table
-print("5️⃣ Creating Top Queries Table...")
-table_payload = {
-    "slice_name": "Top Performing Queries",
-    "datasource_id": dataset_id,
-    "datasource_type": "table",
-    "viz_type": "table",
-    "params": json.dumps({
-        "all_columns": ["query", "clicks", "impressions", "ctr", "position", "device", "country"],
-        "row_limit": 100,
-        "order_desc": True,
-        "metrics": []
+def get_or_create_virtual_dataset(name, sql):
+    """Create a SQL-backed Superset dataset, or update the SQL of an existing one"""
+    # Rison filter on the exact name (not a scan of the first results page)
+    lookup_r = session.get(
+        f"{base_url}/api/v1/dataset/",
+        params={"q": f"(filters:!((col:table_name,opr:eq,value:'{name}')))"}
+    )
+    existing = lookup_r.json().get('result', []) if lookup_r.status_code == 200 else []
+
+    if existing:
+        dataset_id = existing[0]['id']
+        update_r = session.put(f"{base_url}/api/v1/dataset/{dataset_id}", json={"sql": sql})
+        if update_r.status_code not in [200, 201]:
+            print(f"  ⚠️  Could not update SQL of {name}: {update_r.status_code}")
+            return None
+        return dataset_id
+
+    r = session.post(f"{base_url}/api/v1/dataset/", json={
+        "database": 1,  # BigQuery - MCP Servers
+        "schema": "wpp_marketing",
+        "table_name": name,
+        "sql": sql
     })
-}
+    if r.status_code in [200, 201]:
+        return r.json()["id"]
+    return None
+
+# Step 5: Create Top Queries Table (merged top-K sketches, a few KB instead of every raw row)
+print("5️⃣ Creating Top Queries Table...")
+top_queries_dataset_id = get_or_create_virtual_dataset(
+    "gsc_top_queries_7days", top_k_sql(SKETCH_TABLE_REF, "query", "clicks", days=8, limit=100)
+)
+if top_queries_dataset_id:
+    table_payload = {
+        "slice_name": "Top Performing Queries",
+        "datasource_id": top_queries_dataset_id,
+        "datasource_type": "table",
+        "viz_type": "table",
+        "params": json.dumps({
+            "all_columns": ["query", "clicks", "max_overcount"],
+            "row_limit": 100,
+            "order_desc": True,
+            "metrics": []
+        })
+    }
 
-table_r = session.post(f"{base_url}/api/v1/chart/", json=table_payload)
-if table_r.status_code in [200, 201]:
-    charts.append(table_r.json()["id"])
-    print("✅ Top queries table created\n")
+    table_r = session.post(f"{base_url}/api/v1/chart/", json=table_payload)
+    if table_r.status_code in [200, 201]:
+        charts.append(table_r.json()["id"])
+        print("✅ Top queries table created\n")
+else:
+    print("❌ Could not create or find top queries dataset. Skipping chart.\n")
+
+# Step 5b: Unique Queries / Pages scorecards (merged HyperLogLog sketches)
+print("5️⃣ Creating Unique Queries / Pages scorecards...")
+for dimension, label in [("query", "Unique Queries"), ("page", "Unique Pages")]:
+    unique_dataset_id = get_or_create_virtual_dataset(
+        f"gsc_unique_{dimension}_7days", distinct_count_sql(SKETCH_TABLE_REF, dimension, days=8)
+    )
+    if not unique_dataset_id:
+        continue
+
+    unique_r = session.post(f"{base_url}/api/v1/chart/", json={
+        "slice_name": label,
+        "datasource_id": unique_dataset_id,
+        "datasource_type": "table",
+        "viz_type": "big_number_total",
+        "params": json.dumps({
+            "metric": f"MAX(distinct_{dimension}_count)",
+            "adhoc_filters": []
+        })
+    })
+    if unique_r.status_code in [200, 201]:
+        charts.append(unique_r.json()["id"])
+        print(f"  ✅ {label}")
+print()
 
 # Step 6: Create Dashboard
 print("6️⃣ Creating Dashboard...")
@@ -154,7 +215,8 @@ if dash_r.status_code in [200, 201]:
     print(f"✅ Features:")
     print(f"   - 4 KPI Scorecards")
     print(f"   - Time Series (Daily trends)")
-    print(f"   - Top Queries Table (100 rows)")
+    print(f"   - Top Queries Table (100 rows, from sketches)")
+    print(f"   - Unique Queries / Pages (HyperLogLog)")
     print(f"   - All data from BigQuery GSC table")
 else:
     print(f"❌ Dashboard creation failed: {dash_r.status_code}")
@@ -0,0 +1,283 @@
+"""
+Mergeable sketches for high-cardinality GSC columns (query, page)
+
+Built while ingestion streams rows, stored one row per date × property × dimension:
+- Space-Saving top-K by clicks and by impressions (heavy hitters)
+- HyperLogLog distinct counts (registers stored as BYTES)
+
+Both merge across date ranges in plain BigQuery SQL (see top_k_sql and
+distinct_count_sql), so top-N and unique-count widgets read a few KB of
+sketches instead of scanning millions of raw rows.
+"""
+
+import base64
+import hashlib
+import heapq
+import math
+
+SKETCH_TABLE_ID = 'gsc_sketches'
+
+# Dimensions sketched during ingestion
+SKETCH_DIMENSIONS = ['query', 'page']
+
+# Counters kept per top-K sketch (more than any widget shows, so merges stay accurate)
+TOP_K_CAPACITY = 500
+
+# 2^12 registers = 4 KB per sketch, ~1.6% standard error
+HLL_PRECISION = 12
+
+def get_sketch_schema() -> list:
+    """BigQuery schema of the sketch table (imported lazily so the SQL builders don't need the client)"""
+    from google.cloud import bigquery
+
+    top_k_entry = [
+        bigquery.SchemaField("item", "STRING"),
+        bigquery.SchemaField("weight", "INTEGER"),
+        bigquery.SchemaField("error", "INTEGER"),
+    ]
+
+    return [
+        bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
+        bigquery.SchemaField("property", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("dimension", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("row_count", "INTEGER"),
+        bigquery.SchemaField("hll_precision", "INTEGER"),
+        bigquery.SchemaField("hll_registers", "BYTES"),
+        bigquery.SchemaField("top_clicks", "RECORD", mode="REPEATED", fields=top_k_entry),
+        bigquery.SchemaField("top_clicks_floor", "INTEGER", mode="REQUIRED"),
+        bigquery.SchemaField("top_impressions", "RECORD", mode="REPEATED", fields=top_k_entry),
+        bigquery.SchemaField("top_impressions_floor", "INTEGER", mode="REQUIRED"),
+    ]
+
+class TopKSketch:
+    """
+    Weighted Space-Saving heavy-hitter sketch
+
+    Keeps at most `capacity` counters. A new item evicts the smallest counter
+    and inherits its weight as error. For every tracked item the true total
+    lies in [weight - error, weight]; any untracked item's true total is at
+    most `floor`. Merging adds the other sketch's floor to both weight and
+    error of items it doesn't track, which keeps both guarantees.
+
+    The smallest counter is found through a min-heap with lazy invalidation:
+    heap entries may hold an item's older (smaller) weight and are refreshed
+    when popped, so eviction costs O(log capacity) amortized.
+    """
+
+    def __init__(self, capacity: int = TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.counters = {}  # item -> [weight, error]
+        self.heap = []  # (weight when pushed, item), one entry per tracked item
+        self.floor = 0  # upper bound on the total of any untracked item
+
+    def add(self, item: str, weight: int = 1):
+        if weight <= 0:
+            return
+
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [weight, 0]
+            heapq.heappush(self.heap, (weight, item))
+        else:
+            min_weight = self._pop_smallest()
+            self.counters[item] = [min_weight + weight, min_weight]
+            heapq.heappush(self.heap, (min_weight + weight, item))
+            self.floor = max(self.floor, min_weight)
+
+    def _pop_smallest(self) -> int:
+        """Remove the smallest counter and return its weight"""
+        while True:
+            heap_weight, item = heapq.heappop(self.heap)
+            current_weight = self.counters[item][0]
+            if current_weight == heap_weight:
+                del self.counters[item]
+                return current_weight
+            # Stale entry: the counter grew since it was pushed
+            heapq.heappush(self.heap, (current_weight, item))
+
+    def merge(self, other: 'TopKSketch'):
+        merged = {}
+        for item in set(self.counters) | set(other.counters):
+            weight, error = self.counters.get(item, [self.floor, self.floor])
+            other_weight, other_error = other.counters.get(item, [other.floor, other.floor])
+            merged[item] = [weight + other_weight, error + other_error]
+
+        self.counters = merged
+        ranked = self.top(len(merged), with_error=True)
+        dropped = ranked[self.capacity:]
+        self.counters = dict(ranked[:self.capacity])
+        self.floor = max([self.floor + other.floor] + [weight for _, (weight, _) in dropped])
+        self.heap = [(weight, item) for item, (weight, _) in self.counters.items()]
+        heapq.heapify(self.heap)
+
+    def top(self, n: int, with_error: bool = False) -> list:
+        ranked = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)[:n]
+        if with_error:
+            return [(item, [weight, error]) for item, (weight, error) in ranked]
+        return [(item, weight) for item, (weight, _) in ranked]
+
+    def to_rows(self) -> list:
+        return [
+            {'item': item, 'weight': int(weight), 'error': int(error)}
+            for item, (weight, error) in self.top(self.capacity, with_error=True)
+        ]
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter with 2^precision one-byte registers
+
+    Sketches merge by taking the register-wise maximum.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: str):
+        hashed = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HLL precision {other.precision} into {self.precision}")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+
+        # Small-range correction (linear counting)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class DimensionSketch:
+    """Top-K by clicks, top-K by impressions and distinct count for one dimension"""
+
+    def __init__(self):
+        self.row_count = 0
+        self.top_clicks = TopKSketch()
+        self.top_impressions = TopKSketch()
+        self.distinct = HyperLogLog()
+
+    def add(self, item: str, clicks: int, impressions: int):
+        self.row_count += 1
+        self.top_clicks.add(item, clicks)
+        self.top_impressions.add(item, impressions)
+        self.distinct.add(item)
+
+class SketchBuilder:
+    """Accumulates sketches per date × dimension while rows stream in"""
+
+    def __init__(self, property_url: str, dimensions: list = None):
+        self.property_url = property_url
+        self.dimensions = dimensions or SKETCH_DIMENSIONS
+        self.sketches = {}  # (date, dimension) -> DimensionSketch
+
+    def add_row(self, row: dict):
+        for dimension in self.dimensions:
+            key = (row['date'], dimension)
+            sketch = self.sketches.get(key)
+            if sketch is None:
+                sketch = self.sketches[key] = DimensionSketch()
+            sketch.add(row[dimension], int(row['clicks']), int(row['impressions']))
+
+    def to_rows(self) -> list:
+        """Rows for load_table_from_json (BYTES are base64-encoded)"""
+        return [
+            {
+                'date': date,
+                'property': self.property_url,
+                'dimension': dimension,
+                'row_count': sketch.row_count,
+                'hll_precision': sketch.distinct.precision,
+                'hll_registers': base64.b64encode(bytes(sketch.distinct.registers)).decode('ascii'),
+                'top_clicks': sketch.top_clicks.to_rows(),
+                'top_clicks_floor': int(sketch.top_clicks.floor),
+                'top_impressions': sketch.top_impressions.to_rows(),
+                'top_impressions_floor': int(sketch.top_impressions.floor),
+            }
+            for (date, dimension), sketch in sorted(self.sketches.items())
+        ]
+
+def sketch_filter(dimension: str, days: int, property_url: str = None) -> str:
+    """WHERE clause selecting sketches for the last `days` days"""
+    clauses = [
+        f"date >= DATE_SUB(CURRENT_DATE(), INTERVAL {int(days)} DAY)",
+        f"dimension = '{dimension}'",
+    ]
+    if property_url:
+        clauses.append(f"property = '{property_url}'")
+    return ' AND '.join(clauses)
+
+def top_k_sql(table_ref: str, dimension: str = 'query', metric: str = 'clicks',
+              days: int = 7, limit: int = 100, property_url: str = None) -> str:
+    """
+    Merge top-K sketches across dates, same rule as TopKSketch.merge
+
+    Each sketch that doesn't track an item adds its floor to that item's
+    weight and error, so the true total lies in [metric - max_overcount, metric].
+    """
+    if metric not in ('clicks', 'impressions'):
+        raise ValueError(f"Unsupported top-K metric: {metric}")
+
+    return f"""
+    WITH sketches AS (
+      SELECT top_{metric} AS entries, top_{metric}_floor AS sketch_floor
+      FROM `{table_ref}`
+      WHERE {sketch_filter(dimension, days, property_url)}
+    ),
+    floors AS (
+      SELECT SUM(sketch_floor) AS total_floor FROM sketches
+    ),
+    items AS (
+      SELECT
+        entry.item,
+        SUM(entry.weight) AS weight,
+        SUM(entry.error) AS error,
+        SUM(sketch_floor) AS tracked_floor
+      FROM sketches, UNNEST(entries) AS entry
+      GROUP BY entry.item
+    )
+    SELECT
+      item AS {dimension},
+      weight + total_floor - tracked_floor AS {metric},
+      error + total_floor - tracked_floor AS max_overcount
+    FROM items CROSS JOIN floors
+    ORDER BY {metric} DESC
+    LIMIT {int(limit)}
+    """
+
+def distinct_count_sql(table_ref: str, dimension: str = 'query', days: int = 7,
+                       property_url: str = None) -> str:
+    """Merge HLL sketches across dates (register-wise MAX) and estimate distinct count"""
+    registers = 1 << HLL_PRECISION
+
+    return f"""
+    WITH merged AS (
+      SELECT register_index, MAX(register) AS register
+      FROM `{table_ref}`, UNNEST(TO_CODE_POINTS(hll_registers)) AS register WITH OFFSET AS register_index
+      WHERE {sketch_filter(dimension, days, property_url)}
+      GROUP BY register_index
+    ),
+    stats AS (
+      SELECT
+        (0.7213 / (1 + 1.079 / {registers})) * {registers} * {registers} / SUM(POW(2, -register)) AS raw_estimate,
+        COUNTIF(register = 0) AS zeros
+      FROM merged
+    )
+    SELECT CAST(ROUND(
+      IF(raw_estimate <= 2.5 * {registers} AND zeros > 0,
+         {registers} * LN({registers} / zeros),
+         raw_estimate)
+    ) AS INT64) AS distinct_{dimension}_count
+    FROM stats
+    """
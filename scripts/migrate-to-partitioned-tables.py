@@ -9,6 +9,10 @@ This script:
 4. Validates data integrity
 5. Replaces old tables with optimized versions
 
+Tables that are already partitioned but not clustered skip the copy: clustering
+is applied through a table metadata update and re-clustering progress is
+reported on each run (--recluster-days=N rewrites recent partitions in place).
+
 COST IMPACT:
 - Before: $0.20/day (251 queries × 128 MB scans)
 - After: $0.003/day (251 queries × 2 MB scans)
@@ -16,9 +20,10 @@ COST IMPACT:
 """
 
 import sys
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from google.cloud import bigquery
 from google.oauth2 import service_account
+from bq_partitions import RECLUSTER_PROGRESS_TABLE_ID, is_skipped_table, list_date_partitions
 
 SERVICE_ACCOUNT_FILE = '/home/dogancanbaris/projects/MCP Servers/config/service-account-key.json'
 PROJECT_ID = 'mcp-servers-475317'
@@ -31,6 +36,28 @@ CLUSTERING_CONFIG = {
     'analytics': ['workspace_id', 'property_id', 'device_category', 'session_source']
 }
 
+# Hot-table retention. With --archive, partitions are never expired here:
+# scripts/archive-cold-partitions.py moves them to Parquet instead of deleting them.
+PARTITION_EXPIRATION_DAYS = 365
+
+# Column types BigQuery accepts in a clustering spec
+CLUSTERABLE_TYPES = {
+    'STRING', 'INTEGER', 'INT64', 'DATE', 'DATETIME', 'TIMESTAMP',
+    'BOOLEAN', 'BOOL', 'NUMERIC', 'BIGNUMERIC', 'GEOGRAPHY'
+}
+
+# Label recording when clustering was applied through a metadata update.
+# Partitions rewritten after this time are clustered by the new spec.
+CLUSTERED_AT_LABEL = 'clustered_at'
+
+# One row per partition rewritten by --recluster-days (durable progress record)
+RECLUSTER_PROGRESS_SCHEMA = [
+    bigquery.SchemaField("table_name", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("partition_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("clustering_fields", "STRING"),
+    bigquery.SchemaField("rewritten_at", "TIMESTAMP"),
+]
+
 def get_credentials():
     """Initialize BigQuery client with service account"""
     credentials = service_account.Credentials.from_service_account_file(
@@ -49,6 +76,24 @@ def detect_platform_from_table_name(table_name: str) -> str:
         return 'analytics'
     return 'gsc'  # Default fallback
 
+def get_clustering_fields(table, platform: str) -> list:
+    """Pick the platform's clustering fields that exist (and are clusterable) in the table"""
+    clusterable_columns = [
+        field.name for field in table.schema
+        if field.field_type in CLUSTERABLE_TYPES and field.mode != 'REPEATED'
+    ]
+
+    # Determine clustering fields based on what exists in source table
+    desired_clustering = CLUSTERING_CONFIG.get(platform, ['date'])
+    clustering_fields = [field for field in desired_clustering if field in clusterable_columns]
+
+    if not clustering_fields:
+        # Fallback: cluster by date if nothing else available
+        clustering_fields = ['date'] if 'date' in clusterable_columns else []
+
+    # BigQuery allows at most 4 clustering columns
+    return clustering_fields[:4]
+
 def check_table_needs_migration(client, table_ref) -> dict:
     """Check if table needs migration and what's missing"""
     table = client.get_table(table_ref)
@@ -82,7 +127,7 @@ def check_table_needs_migration(client, table_ref) -> dict:
         'current_rows': table.num_rows
     }
 
-def migrate_table(client, table_name: str, platform: str, dry_run: bool = True):
+def migrate_table(client, table_name: str, platform: str, dry_run: bool = True, archive: bool = False):
     """
     Migrate a table to partitioned and clustered architecture
 
@@ -120,13 +165,7 @@ def migrate_table(client, table_name: str, platform: str, dry_run: bool = True):
     existing_columns = [field.name for field in old_table.schema]
     print(f"   Columns in source: {', '.join(existing_columns[:5])}...")
 
-    # Determine clustering fields based on what exists in source table
-    desired_clustering = CLUSTERING_CONFIG.get(platform, ['date'])
-    clustering_fields = [field for field in desired_clustering if field in existing_columns]
-
-    if not clustering_fields:
-        # Fallback: cluster by date if nothing else available
-        clustering_fields = ['date'] if 'date' in existing_columns else []
+    clustering_fields = get_clustering_fields(old_table, platform)
 
     print(f"\n3. Clustering configuration:")
     if clustering_fields:
@@ -140,12 +179,17 @@ def migrate_table(client, table_name: str, platform: str, dry_run: bool = True):
     # Build clustering clause
     cluster_clause = f"CLUSTER BY {', '.join(clustering_fields)}" if clustering_fields else ""
 
+    # Archived tables keep every partition until archive-cold-partitions.py exports it
+    expiration_option = "" if archive else f"partition_expiration_days = {PARTITION_EXPIRATION_DAYS},"
+    if archive:
+        print(f"   Retention: no expiration (cold partitions archived to Parquet)")
+
     create_sql = f"""
     CREATE TABLE `{new_table_ref}`
     PARTITION BY date
     {cluster_clause}
     OPTIONS(
-      partition_expiration_days = 365,
+      {expiration_option}
       require_partition_filter = TRUE,
       description = "Migrated to partitioned architecture on {datetime.now(timezone.utc).strftime('%Y-%m-%d')}"
     )
@@ -293,6 +337,201 @@ def enable_partition_filter_requirement(client, table_name: str, dry_run: bool =
         except Exception as e:
             print(f"   ❌ Error: {e}")
 
+def apply_clustering_metadata(client, table_name: str, platform: str, dry_run: bool = True):
+    """
+    Add clustering to an already-partitioned table through a metadata update
+
+    No data is copied (0 bytes processed). New writes are clustered immediately;
+    existing partitions pick up the new spec as they are rewritten (see
+    report_reclustering_progress / --recluster-days). Full CTAS is only needed
+    when the table must be repartitioned.
+
+    Returns True if clustering was applied (or would be, in dry-run).
+    """
+    print(f"\n{'='*80}")
+    print(f"Applying clustering (metadata only): {table_name}")
+    print("=" * 80)
+
+    table_ref = f"{PROJECT_ID}.{DATASET_ID}.{table_name}"
+    table = client.get_table(table_ref)
+
+    if not table.time_partitioning and not table.range_partitioning:
+        print(f"   ❌ Table not partitioned. Run full migration instead.")
+        return False
+
+    if table.clustering_fields:
+        print(f"   ✅ Already clustered by: {', '.join(table.clustering_fields)}")
+        return False
+
+    clustering_fields = get_clustering_fields(table, platform)
+    partition_field = table.time_partitioning.field if table.time_partitioning else None
+
+    if not clustering_fields or clustering_fields == [partition_field]:
+        print(f"   ⏭️  No useful clustering columns (only the partition column is available)")
+        return False
+
+    print(f"\n   Current: no clustering")
+    print(f"   Target: CLUSTER BY {', '.join(clustering_fields)}")
+    print(f"   Size: {table.num_bytes / (1024**3):.2f} GB (not copied)")
+
+    if dry_run:
+        print(f"\n   [DRY RUN] Would update table metadata: clustering_fields = {clustering_fields}")
+        print(f"   [DRY RUN] Bytes processed: 0 (vs full table for CTAS rewrite)")
+        return True
+
+    try:
+        table.clustering_fields = clustering_fields
+        labels = dict(table.labels or {})
+        labels[CLUSTERED_AT_LABEL] = datetime.now(timezone.utc).strftime('%Y%m%dt%H%M%S')
+        table.labels = labels
+        client.update_table(table, ['clustering_fields', 'labels'])
+        print(f"\n   ✅ Clustering spec updated (0 bytes processed)")
+        print(f"   ℹ️  New data is clustered immediately; existing partitions when rewritten")
+        return True
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        print(f"   Falling back to full migration is required for this table")
+        return False
+
+def load_rewritten_partitions(client, table_name: str, since: datetime) -> set:
+    """Partition IDs recorded as rewritten by recluster_stale_partitions since `since`"""
+    progress_ref = f"{PROJECT_ID}.{DATASET_ID}.{RECLUSTER_PROGRESS_TABLE_ID}"
+
+    try:
+        client.get_table(progress_ref)
+    except Exception:
+        return set()
+
+    sql = f"""
+    SELECT DISTINCT partition_id
+    FROM `{progress_ref}`
+    WHERE table_name = @table_name
+      AND rewritten_at >= @since
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("table_name", "STRING", table_name),
+            bigquery.ScalarQueryParameter("since", "TIMESTAMP", since),
+        ]
+    )
+    return {row['partition_id'] for row in client.query(sql, job_config=job_config).result()}
+
+def record_rewritten_partition(client, table, partition_id: str):
+    """Append one completed rewrite to the progress table"""
+    progress_ref = f"{PROJECT_ID}.{DATASET_ID}.{RECLUSTER_PROGRESS_TABLE_ID}"
+
+    progress_table = bigquery.Table(progress_ref, schema=RECLUSTER_PROGRESS_SCHEMA)
+    progress_table.clustering_fields = ['table_name']
+    client.create_table(progress_table, exists_ok=True)
+
+    job_config = bigquery.LoadJobConfig(
+        schema=RECLUSTER_PROGRESS_SCHEMA,
+        write_disposition="WRITE_APPEND"
+    )
+    row = {
+        'table_name': table.table_id,
+        'partition_id': partition_id,
+        'clustering_fields': ','.join(table.clustering_fields or []),
+        'rewritten_at': datetime.now(timezone.utc).isoformat(),
+    }
+    client.load_table_from_json([row], progress_ref, job_config=job_config).result()
+
+def report_reclustering_progress(client, table_name: str):
+    """
+    Report how much of a table is clustered by its current spec
+
+    A partition counts as clustered when all of its data was written after
+    the clustered_at label was set (partition date after that day), or when
+    recluster_stale_partitions recorded a rewrite of it in the progress
+    table. Returns None for tables not clustered by this script.
+    """
+    table = client.get_table(f"{PROJECT_ID}.{DATASET_ID}.{table_name}")
+    clustered_at_label = (table.labels or {}).get(CLUSTERED_AT_LABEL)
+
+    if not clustered_at_label:
+        return None
+
+    clustered_at = datetime.strptime(clustered_at_label, '%Y%m%dt%H%M%S').replace(tzinfo=timezone.utc)
+    rewritten = load_rewritten_partitions(client, table_name, clustered_at)
+
+    clustered_bytes = 0
+    total_bytes = 0
+    stale_partitions = []
+    for partition in list_date_partitions(client, PROJECT_ID, DATASET_ID, table_name):
+        total_bytes += partition['total_logical_bytes']
+        written_after_clustering = partition['partition_date'] > clustered_at.date()
+        if written_after_clustering or partition['partition_id'] in rewritten:
+            clustered_bytes += partition['total_logical_bytes']
+        else:
+            stale_partitions.append(partition['partition_id'])
+
+    percent = (clustered_bytes / total_bytes * 100) if total_bytes else 100.0
+    print(f"   - {table_name}: {percent:.1f}% re-clustered "
+          f"({len(stale_partitions)} partitions pending, {len(rewritten)} rewritten, "
+          f"clustering applied {clustered_at:%Y-%m-%d})")
+
+    return {
+        'percent': percent,
+        'stale_partitions': sorted(stale_partitions, reverse=True),
+    }
+
+def partition_filter(table, partition_date) -> str:
+    """
+    WHERE clause selecting exactly one daily partition
+
+    Filters the partition column directly (no function wrapped around it) so
+    BigQuery can prune partitions and require_partition_filter is satisfied.
+    """
+    partition_field = table.time_partitioning.field
+    day = partition_date.isoformat()
+    next_day = (partition_date + timedelta(days=1)).isoformat()
+
+    if not partition_field:
+        return f"_PARTITIONDATE = DATE '{day}'"
+
+    field_type = next(field.field_type for field in table.schema if field.name == partition_field)
+    if field_type == 'DATE':
+        return f"{partition_field} = DATE '{day}'"
+    if field_type == 'DATETIME':
+        return f"{partition_field} >= DATETIME '{day}' AND {partition_field} < DATETIME '{next_day}'"
+    return f"{partition_field} >= TIMESTAMP '{day}' AND {partition_field} < TIMESTAMP '{next_day}'"
+
+def recluster_stale_partitions(client, table_name: str, stale_partitions: list, days: int, dry_run: bool = True):
+    """
+    Rewrite the most recent stale partitions in place so they use the new clustering
+
+    Each no-op UPDATE only scans its own partition, so recent (most queried)
+    data can be re-clustered without a full-table CTAS. Completed rewrites are
+    recorded in the progress table so they are never repeated.
+    """
+    table_ref = f"{PROJECT_ID}.{DATASET_ID}.{table_name}"
+    table = client.get_table(table_ref)
+
+    if not table.time_partitioning or table.time_partitioning.type_ != bigquery.TimePartitioningType.DAY:
+        print(f"   ⏭️  {table_name}: in-place re-clustering only supports daily time partitioning")
+        return
+
+    set_column = table.time_partitioning.field or table.clustering_fields[0]
+
+    for partition_id in stale_partitions[:days]:
+        partition_date = datetime.strptime(partition_id, '%Y%m%d').date()
+        update_sql = f"""
+        UPDATE `{table_ref}`
+        SET {set_column} = {set_column}
+        WHERE {partition_filter(table, partition_date)}
+        """
+
+        if dry_run:
+            print(f"   [DRY RUN] Would rewrite partition {partition_date}")
+            continue
+
+        try:
+            client.query(update_sql).result()
+            record_rewritten_partition(client, table, partition_id)
+            print(f"   ✅ Re-clustered partition {partition_date}")
+        except Exception as e:
+            print(f"   ❌ {partition_date}: {e}")
+
 def main():
     """Main migration workflow"""
     print("=" * 80)
@@ -305,10 +544,15 @@ def main():
     # Check for dry-run flag
     dry_run = '--execute' not in sys.argv
     confirm_flag = '--yes' in sys.argv or '-y' in sys.argv
+    archive = '--archive' in sys.argv
+    recluster_days = next(
+        (int(arg.split('=', 1)[1]) for arg in sys.argv if arg.startswith('--recluster-days=')), 0
+    )
 
     if dry_run:
         print("\n⚠️  DRY RUN MODE - No changes will be made")
         print("   To execute migrations, run with: --execute --yes")
+        print("   To archive cold partitions instead of expiring them, add: --archive")
     else:
         print("\n🚨 EXECUTE MODE - Changes WILL be made!")
         if not confirm_flag:
@@ -331,14 +575,15 @@ def main():
     # Categorize tables
     tables_to_migrate = []
     tables_to_update = []
+    tables_clustered = []
     tables_optimized = []
 
     for table_item in tables:
         table_name = table_item.table_id
         table_ref = f"{PROJECT_ID}.{DATASET_ID}.{table_name}"
 
-        # Skip backup and temporary tables
-        if '_backup' in table_name or '_partitioned' in table_name or table_name.startswith('temp_'):
+        # Skip backup, temporary and cold-tier tables (archive-cold-partitions.py)
+        if is_skipped_table(table_name):
             continue
 
         status = check_table_needs_migration(client, table_ref)
@@ -359,7 +604,16 @@ def main():
     for name in tables_optimized:
         print(f"   - {name}")
 
-    print(f"\n🔧 Need ALTER TABLE ({len(tables_to_update)}):")
+    print(f"\n🔄 Re-clustering progress (metadata-only clustering):")
+    reclustering = {}
+    for name in tables_optimized:
+        progress = report_reclustering_progress(client, name)
+        if progress and progress['stale_partitions']:
+            reclustering[name] = progress
+    if not reclustering:
+        print(f"   - No partitions pending re-clustering")
+
+    print(f"\n🔧 Need ALTER TABLE / metadata update ({len(tables_to_update)}):")
     for name, status in tables_to_update:
         print(f"   - {name}")
         print(f"     Issues: {', '.join(status['issues'])}")
@@ -377,7 +631,20 @@ def main():
         print("=" * 80)
 
         for table_name, status in tables_to_update:
-            enable_partition_filter_requirement(client, table_name, dry_run)
+            if 'Missing require_partition_filter' in status['issues']:
+                enable_partition_filter_requirement(client, table_name, dry_run)
+            if 'NOT CLUSTERED' in status['issues']:
+                platform = detect_platform_from_table_name(table_name)
+                if apply_clustering_metadata(client, table_name, platform, dry_run):
+                    tables_clustered.append((table_name, status))
+
+    if reclustering and recluster_days:
+        print("\n" + "=" * 80)
+        print(f"RE-CLUSTERING MOST RECENT {recluster_days} STALE PARTITIONS")
+        print("=" * 80)
+
+        for table_name, progress in reclustering.items():
+            recluster_stale_partitions(client, table_name, progress['stale_partitions'], recluster_days, dry_run)
 
     if tables_to_migrate:
         print("\n" + "=" * 80)
@@ -386,7 +653,7 @@ def main():
 
         for table_name, status in tables_to_migrate:
             platform = detect_platform_from_table_name(table_name)
-            migrate_table(client, table_name, platform, dry_run)
+            migrate_table(client, table_name, platform, dry_run, archive)
 
     # Final summary
     print("\n" + "=" * 80)
@@ -403,8 +670,19 @@ def main():
         print("   1. Run test queries to verify partitioning works")
         print("   2. Monitor query costs for 7 days")
         print("   3. Delete backup tables after verification")
+        if archive:
+            print("   4. Schedule scripts/archive-cold-partitions.py --execute --yes")
         print(f"\n   Expected cost reduction: $0.20/day → $0.003/day")
 
+    # Metadata-only clustering avoids a CTAS copy of the whole table
+    if tables_clustered:
+        avoided_gb = sum(status['current_size_gb'] for _, status in tables_clustered)
+        print(f"\n⚡ METADATA-ONLY CLUSTERING:")
+        print(f"   Tables {'to cluster' if dry_run else 'clustered'} without rewrite: {len(tables_clustered)}")
+        print(f"   CTAS bytes avoided: {avoided_gb:.2f} GB (${avoided_gb / 1000 * 6.25:.2f})")
+        print(f"   Track progress by re-running this script; add --recluster-days=N")
+        print(f"   to rewrite the N most recent un-clustered partitions in place")
+
     # Calculate total savings
     if tables_to_migrate:
         total_size = sum(status['current_size_gb'] for _, status in tables_to_migrate)
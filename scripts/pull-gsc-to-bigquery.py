@@ -2,6 +2,9 @@
 """
 Pull Google Search Console data and load to BigQuery
 For proof of concept: keepersdigital.com last 7 days
+
+While rows stream through, mergeable top-K and HyperLogLog sketches are
+built per date × property for query and page (see gsc_sketches.py).
 """
 
 from google.oauth2 import service_account
@@ -9,6 +12,7 @@ from googleapiclient.discovery import build
 from google.cloud import bigquery
 from datetime import datetime, timedelta
 import json
+from gsc_sketches import SKETCH_TABLE_ID, SketchBuilder, get_sketch_schema
 
 # Service account file
 SERVICE_ACCOUNT_FILE = '/home/dogancanbaris/projects/MCP Servers/mcp-servers-475317-adc00dc800cc.json'
@@ -53,10 +57,11 @@ response = gsc_service.searchanalytics().query(
 
 print(f"✅ Retrieved {len(response.get('rows', []))} rows from GSC")
 
-# Transform to BigQuery format
+# Transform to BigQuery format, sketching query/page as rows stream through
 rows_to_insert = []
+sketches = SketchBuilder(PROPERTY_URL)
 for row in response.get('rows', []):
-    rows_to_insert.append({
+    bq_row = {
         'query': row['keys'][0],
         'page': row['keys'][1],
         'country': row['keys'][2],
@@ -66,7 +71,9 @@ for row in response.get('rows', []):
         'impressions': row['impressions'],
         'ctr': row['ctr'],
         'position': row['position']
-    })
+    }
+    rows_to_insert.append(bq_row)
+    sketches.add_row(bq_row)
 
 print(f"🔄 Loading {len(rows_to_insert)} rows to BigQuery...")
 
@@ -108,5 +115,40 @@ job.result()  # Wait for job to complete
 
 print(f"✅ Loaded to BigQuery: {table_ref}")
 print(f"📈 Rows: {len(rows_to_insert)}")
+
+# Load sketches (one row per date × property × dimension)
+sketch_rows = sketches.to_rows()
+sketch_table_ref = f"{PROJECT_ID}.{DATASET_ID}.{SKETCH_TABLE_ID}"
+sketch_schema = get_sketch_schema()
+print(f"🧮 Loading {len(sketch_rows)} sketches to {SKETCH_TABLE_ID}...")
+
+sketch_table = bigquery.Table(sketch_table_ref, schema=sketch_schema)
+sketch_table.time_partitioning = bigquery.TimePartitioning(field="date")
+sketch_table.clustering_fields = ["property", "dimension"]
+sketch_table.require_partition_filter = True
+bq_client.create_table(sketch_table, exists_ok=True)
+
+# Replace this property's sketches for the pulled range so re-runs don't double count
+delete_job = bq_client.query(
+    f"DELETE FROM `{sketch_table_ref}` "
+    f"WHERE date BETWEEN @start_date AND @end_date AND property = @property",
+    job_config=bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("start_date", "DATE", start_date),
+        bigquery.ScalarQueryParameter("end_date", "DATE", end_date),
+        bigquery.ScalarQueryParameter("property", "STRING", PROPERTY_URL),
+    ])
+)
+delete_job.result()
+
+if sketch_rows:
+    sketch_job = bq_client.load_table_from_json(
+        sketch_rows,
+        sketch_table_ref,
+        job_config=bigquery.LoadJobConfig(schema=sketch_schema, write_disposition="WRITE_APPEND")
+    )
+    sketch_job.result()
+
+sketch_kb = len(json.dumps(sketch_rows)) / 1024
+print(f"✅ Sketches loaded: {sketch_table_ref} ({sketch_kb:.0f} KB vs {len(rows_to_insert)} raw rows)")
 print(f"🔗 View in console: https://console.cloud.google.com/bigquery?project={PROJECT_ID}&ws=!1m5!1m4!4m3!1s{PROJECT_ID}!2s{DATASET_ID}!3s{TABLE_ID}")
 print("\n🎉 SUCCESS! Data ready for Metabase!")